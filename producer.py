@@ -1,14 +1,15 @@
 import argparse
-import json
-import random
 import signal
+import threading
 import time
 import uuid
 from dataclasses import dataclass
-from datetime import datetime, timedelta
 
+import numpy as np
+import orjson
 from confluent_kafka import Producer
-from faker import Faker
+from mimesis import Generic
+from mimesis.locales import Locale
 
 PRODUCT_CATALOG = [
     {"item": "yogurt", "category": "dairy", "base_price": 3.20},
@@ -22,11 +23,54 @@ PRODUCT_CATALOG = [
     {"item": "pasta", "category": "grains", "base_price": 6.20},
     {"item": "eggs", "category": "dairy", "base_price": 7.30},
 ]
+# Katalog rozbity na rownolegle krotki, zeby przy generowaniu nie siegac do slownikow.
+ITEMS = tuple(product["item"] for product in PRODUCT_CATALOG)
+CATEGORIES = tuple(product["category"] for product in PRODUCT_CATALOG)
+PRICE_LO = tuple(product["base_price"] * 0.85 for product in PRODUCT_CATALOG)
+PRICE_HI = tuple(product["base_price"] * 1.20 for product in PRODUCT_CATALOG)
+# Ceny liczymy w groszach na liczbach calkowitych; float dopiero przy budowie rekordu.
+PRICE_LO_CENTS = np.array([round(price * 100) for price in PRICE_LO])
+PRICE_HI_CENTS = np.array([round(price * 100) for price in PRICE_HI])
+DISCOUNTS_ARR = np.array([0, 0, 0, 5, 10, 15])
+PURCHASE_WINDOW_S = 28 * 24 * 3600
+ORDER_ID_BYTES = 16
+# tm_sec moze byc 60 przy sekundzie przestepnej, stad 61 pozycji.
+TWO_DIGITS = tuple(f"{value:02d}" for value in range(61))
 WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 PAYMENT_METHODS = ["card", "blik", "cash", "mobile_wallet"]
 SALES_CHANNELS = ["store", "online", "pickup"]
+ORDER_FIELDS = (
+    "order_id",
+    "user",
+    "item",
+    "category",
+    "quantity",
+    "unit_price",
+    "discount_pct",
+    "total_amount",
+    "payment_method",
+    "sales_channel",
+    "store_city",
+    "purchase_datetime",
+    "purchase_date",
+    "purchase_time",
+    "weekday_name",
+    "weekday_num",
+    "hour_of_day",
+    "is_weekend",
+    "event_time_ms",
+)
+# Kopia gotowego slownika z ustalonymi kluczami jest tansza niz budowanie go od zera.
+ORDER_TEMPLATE = dict.fromkeys(ORDER_FIELDS)
 
-faker = Faker()
+generic = Generic(locale=Locale.EN)
+rng = np.random.default_rng()
+# Klientow i miasta generujemy mimesis raz przy starcie, a w paczce losujemy z puli
+# indeksy w NumPy - wywolania mimesis na kazdy event byly najdrozsza czescia petli.
+USER_POOL_SIZE = 10000
+CITY_POOL_SIZE = 10000
+USERS = tuple(generic.person.full_name() for _ in range(USER_POOL_SIZE))
+CITIES = tuple(generic.address.city() for _ in range(CITY_POOL_SIZE))
 
 
 @dataclass
@@ -66,56 +110,161 @@ def parse_args() -> argparse.Namespace:
         default=5,
         help="How often to print metrics snapshot.",
     )
+    parser.add_argument(
+        "--secure-ids",
+        action="store_true",
+        help="Generate order_id with uuid.uuid4() instead of the NumPy PRNG.",
+    )
+    parser.add_argument(
+        "--gen-batch",
+        type=int,
+        default=256,
+        help="How many orders to generate at once before sending them one by one.",
+    )
+    parser.add_argument(
+        "--linger-ms",
+        type=int,
+        default=100,
+        help="How long librdkafka waits to fill a batch before sending it (linger.ms).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=65536,
+        help="Maximum size of a produce batch in bytes (batch.size).",
+    )
+    parser.add_argument(
+        "--batch-num-messages",
+        type=int,
+        default=10000,
+        help="Maximum number of messages in a produce batch (batch.num.messages).",
+    )
+    parser.add_argument(
+        "--queue-buffering-max-messages",
+        type=int,
+        default=100000,
+        help="Maximum number of messages buffered in the producer queue.",
+    )
+    parser.add_argument(
+        "--compression",
+        default="lz4",
+        choices=["none", "lz4", "zstd", "snappy"],
+        help="Codec used by librdkafka to compress produce batches (compression.type).",
+    )
     return parser.parse_args()
 
 
-def create_order() -> dict:
-    now_dt = datetime.now()
+def create_orders(count: int, secure_ids: bool = False) -> list[dict]:
+    now = time.time()
+    now_s = int(now)
+    now_ms = int(now * 1000)
+    # Czesci liczbowe losujemy wektorowo dla calej paczki, w petli zostaje tylko
+    # skladanie slownikow.
     # Rozkladamy zakupy na ostatnie 4 tygodnie, z losowa pora dnia.
-    purchase_dt = now_dt - timedelta(
-        days=random.randint(0, 27),
-        hours=random.randint(0, 23),
-        minutes=random.randint(0, 59),
-        seconds=random.randint(0, 59),
+    offsets_s = rng.integers(0, PURCHASE_WINDOW_S, count).tolist()
+    idx = rng.integers(0, len(ITEMS), count)
+    quantity = rng.integers(1, 21, count)
+    unit_price_cents = rng.integers(
+        PRICE_LO_CENTS[idx], PRICE_HI_CENTS[idx], endpoint=True
     )
-    now_ms = int(now_dt.timestamp() * 1000)
-    weekday_num = purchase_dt.weekday()
-    product = random.choice(PRODUCT_CATALOG)
-    quantity = faker.random_int(min=1, max=20)
-    unit_price = round(
-        random.uniform(product["base_price"] * 0.85, product["base_price"] * 1.20), 2
-    )
-    discount_pct = random.choice([0, 0, 0, 5, 10, 15])
-    total_amount = round(quantity * unit_price * (1 - discount_pct / 100), 2)
-    return {
-        "order_id": str(uuid.uuid4()),
-        "user": faker.name(),
-        "item": product["item"],
-        "category": product["category"],
-        "quantity": quantity,
-        "unit_price": unit_price,
-        "discount_pct": discount_pct,
-        "total_amount": total_amount,
-        "payment_method": random.choice(PAYMENT_METHODS),
-        "sales_channel": random.choice(SALES_CHANNELS),
-        "store_city": faker.city(),
-        "purchase_datetime": purchase_dt.isoformat(timespec="seconds"),
-        "purchase_date": purchase_dt.date().isoformat(),
-        "purchase_time": purchase_dt.strftime("%H:%M:%S"),
-        "weekday_name": WEEKDAYS[weekday_num],
-        "weekday_num": weekday_num,
-        "hour_of_day": purchase_dt.hour,
-        "is_weekend": weekday_num >= 5,
-        "event_time_ms": now_ms,
-    }
+    discount_pct = rng.choice(DISCOUNTS_ARR, count)
+    # +50 przed dzieleniem calkowitym daje zaokraglenie do pelnego grosza.
+    total_amount_cents = (
+        unit_price_cents * quantity * (100 - discount_pct) + 50
+    ) // 100
+    payment_idx = rng.integers(0, len(PAYMENT_METHODS), count)
+    channel_idx = rng.integers(0, len(SALES_CHANNELS), count)
+    user_idx = rng.integers(0, len(USERS), count)
+    city_idx = rng.integers(0, len(CITIES), count)
+    if secure_ids:
+        order_ids = [str(uuid.uuid4()) for _ in range(count)]
+    else:
+        # 128 losowych bitow na zamowienie z generatora NumPy, bez os.urandom na event.
+        # Bity wersji/wariantu ustawiamy jak w uuid4, zeby format order_id byl ten sam
+        # niezaleznie od --secure-ids.
+        id_bytes = rng.integers(0, 256, (count, ORDER_ID_BYTES), dtype=np.uint8)
+        id_bytes[:, 6] = (id_bytes[:, 6] & 0x0F) | 0x40
+        id_bytes[:, 8] = (id_bytes[:, 8] & 0x3F) | 0x80
+        raw_ids = id_bytes.tobytes().hex()
+        order_ids = []
+        for pos in range(0, len(raw_ids), 2 * ORDER_ID_BYTES):
+            hex_id = raw_ids[pos : pos + 2 * ORDER_ID_BYTES]
+            order_ids.append(
+                f"{hex_id[:8]}-{hex_id[8:12]}-{hex_id[12:16]}"
+                f"-{hex_id[16:20]}-{hex_id[20:]}"
+            )
+
+    orders = []
+    for (
+        order_id, user, city, offset_s, item_idx, qty,
+        price, discount, total, payment, channel,
+    ) in zip(
+        order_ids,
+        [USERS[i] for i in user_idx.tolist()],
+        [CITIES[i] for i in city_idx.tolist()],
+        offsets_s,
+        idx.tolist(),
+        quantity.tolist(),
+        (unit_price_cents / 100).tolist(),
+        discount_pct.tolist(),
+        (total_amount_cents / 100).tolist(),
+        payment_idx.tolist(),
+        channel_idx.tolist(),
+    ):
+        # Jedno localtime() zamiast datetime + strftime; teksty z gotowych tablic.
+        purchase_tm = time.localtime(now_s - offset_s)
+        weekday_num = purchase_tm.tm_wday
+        purchase_date = (
+            f"{purchase_tm.tm_year}-{TWO_DIGITS[purchase_tm.tm_mon]}"
+            f"-{TWO_DIGITS[purchase_tm.tm_mday]}"
+        )
+        purchase_time = (
+            f"{TWO_DIGITS[purchase_tm.tm_hour]}:{TWO_DIGITS[purchase_tm.tm_min]}"
+            f":{TWO_DIGITS[purchase_tm.tm_sec]}"
+        )
+        order = ORDER_TEMPLATE.copy()
+        order["order_id"] = order_id
+        order["user"] = user
+        order["item"] = ITEMS[item_idx]
+        order["category"] = CATEGORIES[item_idx]
+        order["quantity"] = qty
+        order["unit_price"] = price
+        order["discount_pct"] = discount
+        order["total_amount"] = total
+        order["payment_method"] = PAYMENT_METHODS[payment]
+        order["sales_channel"] = SALES_CHANNELS[channel]
+        order["store_city"] = city
+        order["purchase_datetime"] = f"{purchase_date}T{purchase_time}"
+        order["purchase_date"] = purchase_date
+        order["purchase_time"] = purchase_time
+        order["weekday_name"] = WEEKDAYS[weekday_num]
+        order["weekday_num"] = weekday_num
+        order["hour_of_day"] = purchase_tm.tm_hour
+        order["is_weekend"] = weekday_num >= 5
+        order["event_time_ms"] = now_ms
+        orders.append(order)
+    return orders
 
 
 def main() -> None:
     args = parse_args()
     if args.events_per_second <= 0:
         raise ValueError("--events-per-second must be greater than 0")
+    if args.gen_batch <= 0:
+        raise ValueError("--gen-batch must be greater than 0")
 
-    producer = Producer({"bootstrap.servers": args.bootstrap_servers})
+    producer = Producer(
+        {
+            "bootstrap.servers": args.bootstrap_servers,
+            "acks": "all",
+            "linger.ms": args.linger_ms,
+            "batch.size": args.batch_size,
+            "batch.num.messages": args.batch_num_messages,
+            "queue.buffering.max.messages": args.queue_buffering_max_messages,
+            "compression.type": args.compression,
+            "sticky.partitioning.linger.ms": args.linger_ms,
+        }
+    )
     metrics = Metrics()
     should_stop = False
 
@@ -123,70 +272,114 @@ def main() -> None:
         nonlocal should_stop
         should_stop = True
 
-    def delivery_report(err, msg, started_at):
+    def delivery_report(err, msg):
         if err is not None:
             metrics.sent_error += 1
             print(f"[producer][error] {err}")
             return
 
         metrics.sent_ok += 1
-        metrics.ack_latency_total_ms += (time.time() - started_at) * 1000
+        # librdkafka sam mierzy czas od produce() do potwierdzenia brokera, wiec nie
+        # potrzebujemy osobnej funkcji zwrotnej z czasem startu dla kazdego eventu.
+        latency_s = msg.latency()
+        if latency_s is not None:
+            metrics.ack_latency_total_ms += latency_s * 1000
 
     signal.signal(signal.SIGINT, stop_handler)
     signal.signal(signal.SIGTERM, stop_handler)
 
-    start = time.time()
+    stop_polling = threading.Event()
+
+    def poll_loop():
+        # poll() zwalnia GIL, wiec callbacki dostarczenia obslugujemy w tle,
+        # rownolegle z generowaniem eventow.
+        while not stop_polling.is_set():
+            producer.poll(0.1)
+
+    poll_thread = threading.Thread(target=poll_loop, name="producer-poll", daemon=True)
+    poll_thread.start()
+
+    start = time.monotonic()
     last_report = start
-    next_send_time = start
+    # Token bucket: zegar czytamy raz na refill_every eventow (ok. 100 razy na sekunde),
+    # a spimy tylko wtedy, gdy w kubelku zabraknie tokenow.
+    refill_every = max(1, int(args.events_per_second / 100))
+    tokens = float(refill_every)
+    last_refill = start
+    event_time_ms = int(time.time() * 1000)
     produced = 0
+    # Po BufferError produced stoi w miejscu, wiec wymuszamy tick - inaczej petla nie
+    # sprawdzilaby --duration-seconds ani nie wypisala metryk przy pelnej kolejce.
+    force_tick = False
+    pending_orders = iter(())
 
     while not should_stop:
-        now = time.time()
-        if args.duration_seconds > 0 and now - start >= args.duration_seconds:
-            break
         if args.max_events > 0 and produced >= args.max_events:
             break
 
-        order = create_order()
-        payload = json.dumps(order).encode("utf-8")
-        produce_start = time.time()
+        if force_tick or produced % refill_every == 0:
+            force_tick = False
+            now = time.monotonic()
+            if args.duration_seconds > 0 and now - start >= args.duration_seconds:
+                break
+
+            tokens = min(
+                tokens + (now - last_refill) * args.events_per_second, refill_every
+            )
+            last_refill = now
+            if tokens < 1:
+                time.sleep((1 - tokens) / args.events_per_second)
+            # Paczka jest generowana z wyprzedzeniem, wiec czas zdarzenia bierzemy
+            # przy wysylce.
+            event_time_ms = int(time.time() * 1000)
+
+            if now - last_report >= args.report_every_seconds:
+                elapsed = max(now - start, 0.001)
+                throughput = metrics.sent_ok / elapsed
+                avg_ack_ms = (
+                    metrics.ack_latency_total_ms / metrics.sent_ok
+                    if metrics.sent_ok
+                    else 0.0
+                )
+                print(
+                    "[producer][metrics] "
+                    f"sent_ok={metrics.sent_ok} sent_error={metrics.sent_error} "
+                    f"throughput_eps={throughput:.2f} avg_ack_ms={avg_ack_ms:.2f}"
+                )
+                last_report = now
+
+        order = next(pending_orders, None)
+        if order is None:
+            batch_size = args.gen_batch
+            if args.max_events > 0:
+                batch_size = min(batch_size, args.max_events - produced)
+            pending_orders = iter(create_orders(batch_size, secure_ids=args.secure_ids))
+            order = next(pending_orders)
+
+        order["event_time_ms"] = event_time_ms
+        # Szablon bajtowy (b"..." % (...)) ze stalym schematem wypadl wolniej niz kopia
+        # ORDER_TEMPLATE + orjson.dumps, dlatego zostajemy przy slowniku.
+        payload = orjson.dumps(order)
         try:
+            # Bez klucza librdkafka trzyma sie jednej partycji (sticky partitioner),
+            # az paczka sie zapelni, zamiast rozrzucac zdarzenia po wszystkich.
             producer.produce(
                 topic=args.topic,
-                key=order["order_id"].encode("utf-8"),
                 value=payload,
-                callback=lambda err, msg, started=produce_start: delivery_report(
-                    err, msg, started
-                ),
+                callback=delivery_report,
             )
             produced += 1
+            tokens -= 1
         except BufferError:
-            producer.poll(0.1)
+            # Kolejka librdkafka jest pelna - czekamy, az watek poll odbierze ack-i.
+            time.sleep(0.1)
+            force_tick = True
             continue
 
-        producer.poll(0)
-        next_send_time += 1.0 / args.events_per_second
-        sleep_for = next_send_time - time.time()
-        if sleep_for > 0:
-            time.sleep(sleep_for)
-        else:
-            next_send_time = time.time()
-
-        if time.time() - last_report >= args.report_every_seconds:
-            elapsed = max(time.time() - start, 0.001)
-            throughput = metrics.sent_ok / elapsed
-            avg_ack_ms = (
-                metrics.ack_latency_total_ms / metrics.sent_ok if metrics.sent_ok else 0.0
-            )
-            print(
-                "[producer][metrics] "
-                f"sent_ok={metrics.sent_ok} sent_error={metrics.sent_error} "
-                f"throughput_eps={throughput:.2f} avg_ack_ms={avg_ack_ms:.2f}"
-            )
-            last_report = time.time()
-
+    stop_polling.set()
+    poll_thread.join()
     producer.flush(10)
-    elapsed = max(time.time() - start, 0.001)
+    elapsed = max(time.monotonic() - start, 0.001)
     throughput = metrics.sent_ok / elapsed
     avg_ack_ms = metrics.ack_latency_total_ms / metrics.sent_ok if metrics.sent_ok else 0.0
     print(
@@ -1,21 +1,26 @@
 import argparse
-import json
 import random
 import signal
+import threading
 import time
 from dataclasses import dataclass
 
+import orjson
 from confluent_kafka import Producer
 
-from producer import create_order
+from producer import create_orders
 
-INVALID_MODES = [
-    "missing_unit_price",
-    "missing_quantity",
-    "missing_both",
-    "non_positive_unit_price",
-    "non_positive_quantity",
-]
+INVALID_MUTATORS = {
+    "missing_unit_price": lambda order: order.pop("unit_price", None),
+    "missing_quantity": lambda order: order.pop("quantity", None),
+    "missing_both": lambda order: (
+        order.pop("unit_price", None),
+        order.pop("quantity", None),
+    ),
+    "non_positive_unit_price": lambda order: order.__setitem__("unit_price", 0.0),
+    "non_positive_quantity": lambda order: order.__setitem__("quantity", 0),
+}
+INVALID_MODES = list(INVALID_MUTATORS)
 
 
 @dataclass
@@ -55,6 +60,47 @@ def parse_args() -> argparse.Namespace:
         default=5,
         help="How often to print metrics snapshot.",
     )
+    parser.add_argument(
+        "--secure-ids",
+        action="store_true",
+        help="Generate order_id with uuid.uuid4() instead of the NumPy PRNG.",
+    )
+    parser.add_argument(
+        "--gen-batch",
+        type=int,
+        default=256,
+        help="How many orders to generate at once before sending them one by one.",
+    )
+    parser.add_argument(
+        "--linger-ms",
+        type=int,
+        default=100,
+        help="How long librdkafka waits to fill a batch before sending it (linger.ms).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=65536,
+        help="Maximum size of a produce batch in bytes (batch.size).",
+    )
+    parser.add_argument(
+        "--batch-num-messages",
+        type=int,
+        default=10000,
+        help="Maximum number of messages in a produce batch (batch.num.messages).",
+    )
+    parser.add_argument(
+        "--queue-buffering-max-messages",
+        type=int,
+        default=100000,
+        help="Maximum number of messages buffered in the producer queue.",
+    )
+    parser.add_argument(
+        "--compression",
+        default="lz4",
+        choices=["none", "lz4", "zstd", "snappy"],
+        help="Codec used by librdkafka to compress produce batches (compression.type).",
+    )
     parser.add_argument(
         "--invalid-mode",
         default="random",
@@ -64,21 +110,9 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def create_invalid_order(mode: str) -> dict:
-    order = create_order()
-
+def create_invalid_order(order: dict, mode: str) -> dict:
     selected_mode = random.choice(INVALID_MODES) if mode == "random" else mode
-    if selected_mode == "missing_unit_price":
-        order.pop("unit_price", None)
-    elif selected_mode == "missing_quantity":
-        order.pop("quantity", None)
-    elif selected_mode == "missing_both":
-        order.pop("unit_price", None)
-        order.pop("quantity", None)
-    elif selected_mode == "non_positive_unit_price":
-        order["unit_price"] = 0.0
-    elif selected_mode == "non_positive_quantity":
-        order["quantity"] = 0
+    INVALID_MUTATORS[selected_mode](order)
 
     order["invalid_mode"] = selected_mode
     return order
@@ -88,8 +122,21 @@ def main() -> None:
     args = parse_args()
     if args.events_per_second <= 0:
         raise ValueError("--events-per-second must be greater than 0")
-
-    producer = Producer({"bootstrap.servers": args.bootstrap_servers})
+    if args.gen_batch <= 0:
+        raise ValueError("--gen-batch must be greater than 0")
+
+    producer = Producer(
+        {
+            "bootstrap.servers": args.bootstrap_servers,
+            "acks": "all",
+            "linger.ms": args.linger_ms,
+            "batch.size": args.batch_size,
+            "batch.num.messages": args.batch_num_messages,
+            "queue.buffering.max.messages": args.queue_buffering_max_messages,
+            "compression.type": args.compression,
+            "sticky.partitioning.linger.ms": args.linger_ms,
+        }
+    )
     metrics = Metrics()
     should_stop = False
 
@@ -97,70 +144,100 @@ def main() -> None:
         nonlocal should_stop
         should_stop = True
 
-    def delivery_report(err, msg, started_at):
+    def delivery_report(err, msg):
         if err is not None:
             metrics.sent_error += 1
             print(f"[producer_invalid][error] {err}")
             return
 
         metrics.sent_ok += 1
-        metrics.ack_latency_total_ms += (time.time() - started_at) * 1000
+        latency_s = msg.latency()
+        if latency_s is not None:
+            metrics.ack_latency_total_ms += latency_s * 1000
 
     signal.signal(signal.SIGINT, stop_handler)
     signal.signal(signal.SIGTERM, stop_handler)
 
-    start = time.time()
+    stop_polling = threading.Event()
+
+    def poll_loop():
+        while not stop_polling.is_set():
+            producer.poll(0.1)
+
+    poll_thread = threading.Thread(target=poll_loop, name="producer-poll", daemon=True)
+    poll_thread.start()
+
+    start = time.monotonic()
     last_report = start
-    next_send_time = start
+    refill_every = max(1, int(args.events_per_second / 100))
+    tokens = float(refill_every)
+    last_refill = start
+    event_time_ms = int(time.time() * 1000)
     produced = 0
+    force_tick = False
+    pending_orders = iter(())
 
     while not should_stop:
-        now = time.time()
-        if args.duration_seconds > 0 and now - start >= args.duration_seconds:
-            break
         if args.max_events > 0 and produced >= args.max_events:
             break
 
-        order = create_invalid_order(args.invalid_mode)
-        payload = json.dumps(order).encode("utf-8")
-        produce_start = time.time()
+        if force_tick or produced % refill_every == 0:
+            force_tick = False
+            now = time.monotonic()
+            if args.duration_seconds > 0 and now - start >= args.duration_seconds:
+                break
+
+            tokens = min(
+                tokens + (now - last_refill) * args.events_per_second, refill_every
+            )
+            last_refill = now
+            if tokens < 1:
+                time.sleep((1 - tokens) / args.events_per_second)
+            event_time_ms = int(time.time() * 1000)
+
+            if now - last_report >= args.report_every_seconds:
+                elapsed = max(now - start, 0.001)
+                throughput = metrics.sent_ok / elapsed
+                avg_ack_ms = (
+                    metrics.ack_latency_total_ms / metrics.sent_ok
+                    if metrics.sent_ok
+                    else 0.0
+                )
+                print(
+                    "[producer_invalid][metrics] "
+                    f"sent_ok={metrics.sent_ok} sent_error={metrics.sent_error} "
+                    f"throughput_eps={throughput:.2f} avg_ack_ms={avg_ack_ms:.2f}"
+                )
+                last_report = now
+
+        order = next(pending_orders, None)
+        if order is None:
+            batch_size = args.gen_batch
+            if args.max_events > 0:
+                batch_size = min(batch_size, args.max_events - produced)
+            pending_orders = iter(create_orders(batch_size, secure_ids=args.secure_ids))
+            order = next(pending_orders)
+
+        order["event_time_ms"] = event_time_ms
+        order = create_invalid_order(order, args.invalid_mode)
+        payload = orjson.dumps(order)
         try:
             producer.produce(
                 topic=args.topic,
-                key=order["order_id"].encode("utf-8"),
                 value=payload,
-                callback=lambda err, msg, started=produce_start: delivery_report(
-                    err, msg, started
-                ),
+                callback=delivery_report,
             )
             produced += 1
+            tokens -= 1
         except BufferError:
-            producer.poll(0.1)
+            time.sleep(0.1)
+            force_tick = True
             continue
 
-        producer.poll(0)
-        next_send_time += 1.0 / args.events_per_second
-        sleep_for = next_send_time - time.time()
-        if sleep_for > 0:
-            time.sleep(sleep_for)
-        else:
-            next_send_time = time.time()
-
-        if time.time() - last_report >= args.report_every_seconds:
-            elapsed = max(time.time() - start, 0.001)
-            throughput = metrics.sent_ok / elapsed
-            avg_ack_ms = (
-                metrics.ack_latency_total_ms / metrics.sent_ok if metrics.sent_ok else 0.0
-            )
-            print(
-                "[producer_invalid][metrics] "
-                f"sent_ok={metrics.sent_ok} sent_error={metrics.sent_error} "
-                f"throughput_eps={throughput:.2f} avg_ack_ms={avg_ack_ms:.2f}"
-            )
-            last_report = time.time()
-
+    stop_polling.set()
+    poll_thread.join()
     producer.flush(10)
-    elapsed = max(time.time() - start, 0.001)
+    elapsed = max(time.monotonic() - start, 0.001)
     throughput = metrics.sent_ok / elapsed
     avg_ack_ms = metrics.ack_latency_total_ms / metrics.sent_ok if metrics.sent_ok else 0.0
     print(
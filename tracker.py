@@ -1,10 +1,13 @@
 import argparse
-import json
 import time
 from dataclasses import dataclass
 
+import orjson
 from confluent_kafka import Consumer
 
+# Gorny limit num_messages w Consumer.consume() po stronie librdkafka.
+MAX_CONSUME_BATCH = 1000000
+
 
 @dataclass
 class Metrics:
@@ -21,15 +24,31 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--topic", default="orders")
     parser.add_argument("--group-id", default="order-tracker")
     parser.add_argument("--commit-every", type=int, default=100)
+    parser.add_argument(
+        "--consume-batch",
+        type=int,
+        default=500,
+        help="Maximum number of messages fetched by a single consume() call.",
+    )
     parser.add_argument("--report-every-seconds", type=int, default=5)
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print every consumed event. Off by default, stdout slows down fast runs.",
+    )
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
+    if args.consume_batch <= 0:
+        raise ValueError("--consume-batch must be greater than 0")
+    if args.consume_batch > MAX_CONSUME_BATCH:
+        raise ValueError(f"--consume-batch must not exceed {MAX_CONSUME_BATCH}")
     metrics = Metrics()
     started = time.time()
     last_report = started
+    processed_at_commit = 0
 
     consumer_config = {
         "bootstrap.servers": args.bootstrap_servers,
@@ -44,36 +63,52 @@ def main() -> None:
 
     try:
         while True:
+            # consume() z timeoutem czeka do konca okna, gdy paczka nie jest pelna,
+            # co zawyzalo opoznienie. Na pierwsza wiadomosc czekamy wiec przez poll(),
+            # a reszte juz pobranych zabieramy bez czekania przez consume(timeout=0).
             msg = consumer.poll(1.0)
             if msg is None:
-                continue
-            if msg.error():
-                metrics.errors += 1
-                print(f"[consumer][error] {msg.error()}")
-                continue
-
-            try:
-                payload = msg.value().decode("utf-8")
-                order = json.loads(payload)
-            except Exception as exc:  # pylint: disable=broad-except
-                metrics.errors += 1
-                print(f"[consumer][error] invalid message: {exc}")
-                continue
-
-            metrics.processed += 1
-            event_time_ms = order.get("event_time_ms")
-            if isinstance(event_time_ms, int):
-                metrics.latency_total_ms += (time.time() * 1000) - event_time_ms
-
-            print(
-                "[consumer][event] "
-                f"offset={msg.offset()} partition={msg.partition()} "
-                f"order_id={order.get('order_id')} item={order.get('item')} "
-                f"quantity={order.get('quantity')}"
-            )
-
-            if args.commit_every > 0 and metrics.processed % args.commit_every == 0:
-                consumer.commit(asynchronous=False)
+                msgs = []
+            elif args.consume_batch > 1:
+                msgs = [msg] + consumer.consume(
+                    num_messages=args.consume_batch - 1, timeout=0
+                )
+            else:
+                msgs = [msg]
+            received_ms = time.time() * 1000
+            for msg in msgs:
+                if msg.error():
+                    metrics.errors += 1
+                    print(f"[consumer][error] {msg.error()}")
+                    continue
+
+                try:
+                    order = orjson.loads(msg.value())
+                except Exception as exc:  # pylint: disable=broad-except
+                    metrics.errors += 1
+                    print(f"[consumer][error] invalid message: {exc}")
+                    continue
+
+                metrics.processed += 1
+                event_time_ms = order.get("event_time_ms")
+                if isinstance(event_time_ms, int):
+                    metrics.latency_total_ms += received_ms - event_time_ms
+
+                if args.verbose:
+                    print(
+                        "[consumer][event] "
+                        f"offset={msg.offset()} partition={msg.partition()} "
+                        f"order_id={order.get('order_id')} item={order.get('item')} "
+                        f"quantity={order.get('quantity')}"
+                    )
+
+            # Commit raz na paczke (asynchronicznie), obejmuje pozycje calej paczki.
+            if (
+                args.commit_every > 0
+                and metrics.processed - processed_at_commit >= args.commit_every
+            ):
+                consumer.commit(asynchronous=True)
+                processed_at_commit = metrics.processed
 
             if time.time() - last_report >= args.report_every_seconds:
                 elapsed = max(time.time() - started, 0.001)